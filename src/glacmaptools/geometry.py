@@ -1,8 +1,11 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import geoutils as gu
+import shapely
 from shapely.geometry import Polygon
 from . import utils
 from typing import TypeVar, Union
@@ -11,6 +14,9 @@ from typing import TypeVar, Union
 # This is a generic Vector-type (if subclasses are made, this will change appropriately)
 GlacierOutlinesType = TypeVar("GlacierOutlinesType", bound="GlacierOutlines")
 
+# below this many outlines, checking every pair of bounding boxes is faster than building a spatial index
+MIN_SINDEX_SIZE = 64
+
 class GlacierOutlines(gu.Vector):
     """
     A vector geometry representing glacier outlines, based on geoutils.Vector.
@@ -27,6 +33,7 @@ class GlacierOutlines(gu.Vector):
 
        validate(): check whether the outlines have topological or other errors.
        get_overlaps(): return a Vector object with all areas where outlines overlap.
+       has_overlaps(): check whether any of the outlines overlap.
        join_other(): spatially join the outlines to another set of outlines
        join_rgi(): spatially join the outlines to RGI outlines
     """
@@ -35,11 +42,18 @@ class GlacierOutlines(gu.Vector):
 
     def total_envelope(self) -> Polygon:
         "The total envelope of the outlines."
-        return self.union_all().envelope.ds.loc[0, 'geometry']
+        minx, miny, maxx, maxy = self.ds.total_bounds
+
+        # with no (non-empty) outlines, the bounds are all NaN
+        if np.isnan(minx):
+            return shapely.Point()
+
+        return shapely.box(minx, miny, maxx, maxy)
 
     def validate(self,
                  overlap_ok: bool = False,
-                 multi_ok: bool = False) -> None:
+                 multi_ok: bool = False,
+                 n_jobs: int = 1) -> None:
         """
         Checks the GlacierOutlines geometries for the following errors:
 
@@ -54,6 +68,8 @@ class GlacierOutlines(gu.Vector):
 
         :param overlap_ok: outlines are allowed to overlap.
         :param multi_ok: outlines are allowed to be multi-part.
+        :param n_jobs: the number of threads to use when checking for overlaps (a positive integer, or -1
+            to use all available cores).
         """
         # run remove_repeated_points
         # check for invalid geometries using is_valid
@@ -64,47 +80,52 @@ class GlacierOutlines(gu.Vector):
         has_overlap = False
         has_invalid = False
 
+        geoms = self.ds.geometry.values
+
         # check for overlaps
-        pairs = self._overlapping_inds()
+        left, right = self._overlapping_positions(n_jobs=n_jobs)
 
-        if len(pairs) > 0:
-            overlap_gdf = self.get_overlaps()
+        if len(left) > 0:
+            overlap_gdf = self._overlap_geometries(left, right)
 
-            print(f"Found {len(pairs)} pairs of overlapping geometries.")
+            print(f"Found {len(left)} pairs of overlapping geometries.")
             print(f"Saving overlaps to errors/{output_prefix}_overlaps.gpkg for review.")
             os.makedirs('errors', exist_ok=True)
 
-            overlap_gdf.to_file(Path('errors', output_prefix + '_overlaps.gpkg'))
+            # error files are only written for review, so don't build a spatial index for them
+            overlap_gdf.to_file(Path('errors', output_prefix + '_overlaps.gpkg'), SPATIAL_INDEX='NO')
 
             if not overlap_ok:
                 has_overlap = True
 
         # check validity
-        if not all(self.is_valid):
+        valid_mask = shapely.is_valid(geoms)
+
+        if not valid_mask.all():
             os.makedirs('errors', exist_ok=True)
             has_invalid = True
 
             print('Invalid geometries found.')
             print(f"Saving invalid outlines to errors/{output_prefix}_invalid.gpkg for review.")
-            invalid = self.ds.loc[~self.is_valid]
-            invalid['reason'] = invalid.is_valid_reason()
-            invalid.to_file(Path('errors', output_prefix + '_invalid.gpkg'))
+            invalid = self.ds.loc[~valid_mask].copy()
+            invalid['reason'] = shapely.is_valid_reason(geoms[~valid_mask])
+            invalid.to_file(Path('errors', output_prefix + '_invalid.gpkg'), SPATIAL_INDEX='NO')
 
         if not multi_ok:
-            has_multi = not len(self.ds) == len(self.ds.explode())
+            multi_mask = shapely.get_num_geometries(geoms) > 1
+            has_multi = multi_mask.any()
             if has_multi:
                 print('MultiPolygon geometries found.')
                 print(f"Saving to errors/{output_prefix}_multi.gpkg for review.")
+                os.makedirs('errors', exist_ok=True)
 
-                exploded = self.explode()
-                multiinds = exploded[exploded.ds.index.duplicated()].index.to_list()
-                self[self.ds.index.isin(multiinds)].to_file(Path('errors', output_prefix + '_multi.gpkg'))
+                self[multi_mask].to_file(Path('errors', output_prefix + '_multi.gpkg'), SPATIAL_INDEX='NO')
         else:
             has_multi = False
 
         # remove repeated points
-        cleaned_geom = self.ds.remove_repeated_points(tolerance=1e-6)
-        self['geometry'] = cleaned_geom
+        cleaned_geom = shapely.remove_repeated_points(geoms, tolerance=1e-6)
+        self['geometry'] = gpd.GeoSeries(cleaned_geom, index=self.ds.index, crs=self.crs)
 
         assert not any([has_overlap, has_invalid, has_multi]), "One or more checks failed."
 
@@ -114,39 +135,133 @@ class GlacierOutlines(gu.Vector):
         os.makedirs('cleaned', exist_ok=True)
         self.to_file(Path('cleaned', output_prefix + '.gpkg'))
 
-    def get_overlaps(self) -> gu.Vector:
+    def get_overlaps(self, n_jobs: int = 1) -> gu.Vector:
         """
         Find all overlapping geometries in the current set of outlines.
 
+        :param n_jobs: the number of threads to use when checking for overlaps (a positive integer, or -1
+            to use all available cores).
         :return: the overlapping geometries.
         """
-        pairs = self._overlapping_inds()
+        left, right = self._overlapping_positions(n_jobs=n_jobs)
+
+        return self._overlap_geometries(left, right)
+
+    def _overlap_geometries(self, left: np.ndarray, right: np.ndarray) -> gu.Vector:
+        geoms = self.ds.geometry.values
+
+        overlaps = shapely.intersection(geoms.take(left), geoms.take(right))
+
+        # split any multi-part intersections into single parts, keeping track of which pair each part came from
+        parts, pair = shapely.get_parts(overlaps, return_index=True)
+
+        overlap_gdf = gpd.GeoDataFrame(data={'ind1': self.ds.index[left[pair]],
+                                             'ind2': self.ds.index[right[pair]],
+                                             'geometry': parts}, index=pair, crs=self.crs)
+
+        return gu.Vector(overlap_gdf)
+
+    def has_overlaps(self) -> bool:
+        """
+        Check whether any of the outlines overlap, stopping at the first overlapping pair found.
+
+        :return: True if at least one pair of outlines overlaps.
+        """
+        return len(self._overlapping_inds(first_only=True)) > 0
+
+    def _overlapping_positions(self, first_only: bool = False,
+                               chunk_size: int = 1024,
+                               n_jobs: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        if n_jobs != -1 and n_jobs < 1:
+            raise ValueError(f"n_jobs must be a positive integer, or -1 to use all available cores (got {n_jobs}).")
+
+        geoms = self.ds.geometry.values
+
+        # for a small number of outlines, building the spatial index costs more than it saves, so just compare the
+        # bounding boxes of every pair directly and test the candidates that are left
+        if len(geoms) < MIN_SINDEX_SIZE:
+            bounds = shapely.bounds(geoms)
+            left, right = np.triu_indices(len(geoms), k=1)
+
+            candidates = (bounds[left, 0] <= bounds[right, 2]) & (bounds[left, 2] >= bounds[right, 0]) & \
+                         (bounds[left, 1] <= bounds[right, 3]) & (bounds[left, 3] >= bounds[right, 1])
+            left, right = left[candidates], right[candidates]
+
+            overlaps = shapely.overlaps(geoms.take(left), geoms.take(right))
+            left, right = left[overlaps], right[overlaps]
 
-        geoms = []
-        for ind1, ind2 in pairs:
-            geoms.append(self.ds.loc[ind1, 'geometry'].intersection(self.ds.loc[ind2, 'geometry']))
+            if first_only:
+                return left[:1], right[:1]
 
-        left, right = zip(*pairs)
-        overlap_gdf = gu.Vector(gpd.GeoDataFrame(data={'geometry': geoms, 'ind1': left, 'ind2': right},
-                                                       crs=self.crs)).explode()
+            return left, right
 
-        return overlap_gdf.explode()
+        # use the spatial index of the GeoDataFrame to only test pairs whose bounding boxes intersect. geopandas
+        # builds this once and keeps it until the geometries change, so repeated calls don't rebuild the tree.
+        tree = self.ds.sindex
 
-    def _overlapping_inds(self) -> list[tuple[int, int]]:
-        overlaps = []
-        overlap_inds = []
+        if first_only:
+            # query in chunks, so that we can stop as soon as we find an overlap
+            for start in range(0, len(geoms), chunk_size):
+                left, right = tree.query(geoms[start:start + chunk_size], predicate='overlaps')
+                left += start
 
-        for n, ind in enumerate(self.index[:-1], 1):
-            poly = self.ds.loc[ind, 'geometry']
-            has_overlap = [g.overlaps(poly) for g in self.ds.loc[n + 1:, 'geometry']]
+                keep = left < right
+                if keep.any():
+                    first = np.lexsort((right[keep], left[keep]))[:1]
+                    return left[keep][first], right[keep][first]
 
-            if any(has_overlap):
-                overlaps.append(ind)
-                for oind, row in self.ds.loc[n + 1:].iterrows():
-                    if row['geometry'].overlaps(poly):
-                        overlap_inds.append((ind, oind))
+            return np.array([], dtype=int), np.array([], dtype=int)
 
-        return overlap_inds
+        # get the candidate pairs from the bounding boxes; overlaps is symmetric, so only keep each pair once
+        left, right = tree.query(geoms)
+
+        keep = left < right
+        left, right = left[keep], right[keep]
+
+        order = np.lexsort((right, left))
+        left, right = left[order], right[order]
+
+        overlaps = self._test_overlaps(left, right, n_jobs=n_jobs)
+
+        return left[overlaps], right[overlaps]
+
+    def _test_overlaps(self, left: np.ndarray, right: np.ndarray, n_jobs: int = 1) -> np.ndarray:
+        # left must be sorted, so that all of the pairs for a given left-hand geometry are next to each other
+        geoms = np.asarray(self.ds.geometry.values)
+
+        # prepare each geometry on the left side of a pair once, rather than on every test. only geometries that
+        # weren't already prepared are prepared here, and they're cleaned up afterwards to avoid holding on to the
+        # (potentially large) prepared structures.
+        to_prepare = np.unique(left)
+        to_prepare = geoms[to_prepare[~shapely.is_prepared(geoms[to_prepare])]]
+        shapely.prepare(to_prepare)
+
+        try:
+            if n_jobs == 1:
+                return shapely.overlaps(geoms[left], geoms[right])
+
+            # GEOS builds the internal index of a prepared geometry on first use, which isn't thread-safe. so, split
+            # the pairs into chunks of roughly equal size, but only at the start of a new left-hand geometry, so that
+            # each prepared geometry is only ever used by one thread. shapely releases the GIL for vectorized
+            # operations, so threads are enough here.
+            n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+
+            starts = np.append(np.unique(left, return_index=True)[1], len(left))
+            targets = np.arange(1, n_jobs) * len(left) // n_jobs
+            chunks = [c for c in np.split(np.arange(len(left)), np.unique(starts[np.searchsorted(starts, targets)]))
+                      if len(c) > 0]
+
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(lambda c: shapely.overlaps(geoms[left[c]], geoms[right[c]]), chunks))
+
+            return np.concatenate(results) if results else np.array([], dtype=bool)
+        finally:
+            shapely.destroy_prepared(to_prepare)
+
+    def _overlapping_inds(self, first_only: bool = False, n_jobs: int = 1) -> list[tuple[int, int]]:
+        left, right = self._overlapping_positions(first_only=first_only, n_jobs=n_jobs)
+
+        return list(zip(self.ds.index[left], self.ds.index[right]))
 
     def labeled_difference(self, other: Union[GlacierOutlinesType, str, Path],
                            filter: bool = True) -> GlacierOutlinesType:
@@ -168,16 +283,16 @@ class GlacierOutlines(gu.Vector):
         if filter:
             other = self.filter_other(other)
 
-        other = other.union_all()
-        update = self.union_all()
+        other = shapely.union_all(other.ds.to_crs(self.crs).geometry.values)
+        update = shapely.union_all(self.ds.geometry.values)
 
-        removed = other.difference(update).explode()
-        added = update.difference(other).explode()
+        removed = shapely.get_parts(shapely.difference(other, update))
+        added = shapely.get_parts(shapely.difference(update, other))
 
-        removed['difference'] = 'removed'
-        added['difference'] = 'added'
+        labels = np.repeat(['added', 'removed'], [len(added), len(removed)]).astype(object)
 
-        return gu.Vector(pd.concat([added.ds, removed.ds], ignore_index=True))
+        return gu.Vector(gpd.GeoDataFrame(data={'geometry': np.concatenate([added, removed]),
+                                                'difference': labels}, crs=self.crs))
 
     def filter_other(self, other: GlacierOutlinesType) -> GlacierOutlinesType:
         """
@@ -186,7 +301,28 @@ class GlacierOutlines(gu.Vector):
         :param other: the other outlines.
         :return: the other outlines, filtered to the intersection of the total bounds of self.
         """
-        return other[other.ds.to_crs(self.crs).intersects(self.total_envelope())].copy()
+        minx, miny, maxx, maxy = self.ds.total_bounds
+
+        other_geoms = other.ds.to_crs(self.crs).geometry.values
+        other_bounds = shapely.bounds(other_geoms)
+
+        # first, a cheap filter using the bounding box of each outline
+        mask = (other_bounds[:, 0] <= maxx) & (other_bounds[:, 2] >= minx) & \
+               (other_bounds[:, 1] <= maxy) & (other_bounds[:, 3] >= miny)
+
+        # outlines with a bounding box entirely inside the envelope must intersect it, so only the outlines
+        # that straddle the edge of the envelope need to be checked with shapely.intersects
+        inside = (other_bounds[:, 0] >= minx) & (other_bounds[:, 2] <= maxx) & \
+                 (other_bounds[:, 1] >= miny) & (other_bounds[:, 3] <= maxy)
+
+        edge = mask & ~inside
+
+        envelope = self.total_envelope()
+        shapely.prepare(envelope)
+
+        mask[edge] = shapely.intersects(envelope, other_geoms[edge])
+
+        return other[mask].copy()
 
     def join_other(self,
                    other: Union[GlacierOutlinesType, str, Path],
@@ -245,10 +381,13 @@ class GlacierOutlines(gu.Vector):
            row number of the GeoDataFrame.
         """
         if prefix is None:
-            self.ds.index = range(len(self.ds))
+            self.ds.index = pd.RangeIndex(len(self.ds))
+        elif len(self.ds) == 0:
+            self.ds.index = pd.Index([], dtype=object)
         else:
             ndigits = len(str(len(self.ds)))
-            self.ds.index = [f"{prefix}.{str(n+1).zfill(ndigits)}" for n in range(len(self.ds))]
+            labels = np.char.zfill(np.arange(1, len(self.ds) + 1).astype(str), ndigits)
+            self.ds.index = pd.Index(np.char.add(f"{prefix}.", labels), dtype=object)
 
     def compute_area_change(self,
                             other: Union[GlacierOutlinesType, str, Path],
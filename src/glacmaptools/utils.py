@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from typing import Union
 
@@ -44,6 +45,25 @@ rgi_regions = {'v7.0': [
     '19_rgi60_AntarcticSubantarctic'
 ]}
 
+# index of the shapefiles found in each RGI directory, keyed by the (normalized) directory path as given and then by
+# filename (without extension). Paths are stored relative to the RGI directory.
+_shp_index: dict[str, dict[str, Path]] = {}
+
+
+def _index_shapefiles(rgi_dir: Union[str, Path]) -> dict[str, Path]:
+    """
+    Find all of the shapefiles stored in a directory, or in a sub-directory with the same name as the shapefile.
+    Files in the directory itself take precedence over files in a sub-directory.
+
+    :param rgi_dir: The path to the directory where the RGI files or folders are stored.
+    """
+    index = {fn.stem: fn.relative_to(rgi_dir) for fn in Path(rgi_dir).glob('*/*.shp') if fn.parent.name == fn.stem}
+    index.update({fn.stem: fn.relative_to(rgi_dir) for fn in Path(rgi_dir).glob('*.shp')})
+
+    _shp_index[os.path.normpath(rgi_dir)] = index
+    return index
+
+
 def rgi_loader(rgi_dir: Union[str, Path], rgi_reg: Union[int, str, Path], version: str = 'v7.0') -> Path:
     """
     Returns the path to the RGI shapefile for the given region and version. Checks whether RGI files are stored in
@@ -57,10 +77,23 @@ def rgi_loader(rgi_dir: Union[str, Path], rgi_reg: Union[int, str, Path], versio
     if isinstance(rgi_reg, int):
         rgi_reg = rgi_regions[version][rgi_reg-1] # subtract 1 to get the index
 
-    # load the RGI outlines
-    if Path(rgi_dir, rgi_reg + '.shp').exists():
-        return Path(rgi_dir, rgi_reg + '.shp')
-    elif Path(rgi_dir, rgi_reg, rgi_reg + '.shp').exists():
-        return Path(rgi_dir, rgi_reg, rgi_reg + '.shp')
+    # look up the RGI outlines in the index. the indexed file is checked before it is returned, so a hit costs no more
+    # than checking the two possible locations directly: a top-level file takes precedence, so it is checked first
+    # when the index points to a sub-directory (e.g., in case it was added after the directory was indexed).
+    index = _shp_index.get(os.path.normpath(rgi_dir), {})
+    cached = index.get(rgi_reg)
+
+    if cached is not None:
+        if cached.parent != Path('.') and Path(rgi_dir, rgi_reg + '.shp').exists():
+            index[rgi_reg] = Path(rgi_reg + '.shp')
+            return Path(rgi_dir, rgi_reg + '.shp')
+        elif Path(rgi_dir, cached).exists():
+            return Path(rgi_dir, cached)
+
+    # if the file isn't in the index, or the indexed file no longer exists, re-scan the directory
+    index = _index_shapefiles(rgi_dir)
+
+    if rgi_reg in index:
+        return Path(rgi_dir, index[rgi_reg])
     else:
         raise FileNotFoundError(f"Unable to find {rgi_reg}.shp in {rgi_dir}, or a sub-directory. Please check path and filename.")
@@ -0,0 +1,44 @@
+import numpy as np
+import geopandas as gpd
+import pytest
+import shapely
+from glacmaptools.geometry import GlacierOutlines, MIN_SINDEX_SIZE
+
+
+@pytest.fixture
+def outlines() -> GlacierOutlines:
+    # a handful of large, detailed outlines, each overlapping thousands of small ones, so that each large outline has
+    # candidate pairs that would be spread across several chunks
+    rng = np.random.default_rng(0)
+    large = [shapely.buffer(shapely.Point(x, 0), 30, quad_segs=256) for x in (0, 10, 20, 30)]
+
+    xy = np.column_stack([rng.uniform(-30, 60, 3000), rng.uniform(-30, 30, 3000)])
+    small = list(shapely.buffer(shapely.points(xy), 0.5))
+
+    return GlacierOutlines(gpd.GeoDataFrame(geometry=large + small, crs='epsg:32606'))
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3, 8, 64, -1])
+def test_overlapping_inds_parallel(outlines, n_jobs):
+    assert len(outlines.ds) >= MIN_SINDEX_SIZE
+
+    serial = outlines._overlapping_inds(n_jobs=1)
+    assert len(serial) > 0
+
+    assert outlines._overlapping_inds(n_jobs=n_jobs) == serial
+
+
+def test_overlapping_inds_matches_predicate(outlines):
+    left, right = outlines.ds.sindex.query(outlines.ds.geometry.values, predicate='overlaps')
+    keep = left < right
+
+    assert outlines._overlapping_inds() == sorted(zip(left[keep].tolist(), right[keep].tolist()))
+
+    # the geometries should not be left prepared
+    assert not shapely.is_prepared(outlines.ds.geometry.values).any()
+
+
+@pytest.mark.parametrize('n_jobs', [0, -2])
+def test_overlapping_inds_bad_n_jobs(outlines, n_jobs):
+    with pytest.raises(ValueError):
+        outlines._overlapping_inds(n_jobs=n_jobs)